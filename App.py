@@ -12,6 +12,8 @@ How to use:
 
 Notes:
 - This single file uses only Python standard library (tested on Python 3.8+).
+  If aiohttp is installed, OpenAI requests go through a shared async client;
+  if orjson is installed, it replaces json for encoding and decoding.
 - The server sends your prompt to OpenAI Chat Completions API and expects the model to
   return a JSON object with shape:
     {"files": [{"path":"relative/path/name.ext", "content":"...","encoding":"base64"(optional)} , ...]}
@@ -20,21 +22,127 @@ Notes:
 """
 import os
 import io
+import re
+import time
+import gzip
+import queue
+import logging
+import logging.handlers
+import asyncio
 import json
-import base64
+import hashlib
+import operator
+import binascii
 import zipfile
 import threading
+import http.client
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from socketserver import ThreadingMixIn
-from urllib import request as urllib_request
-from urllib.error import HTTPError, URLError
+
+try:
+    import aiohttp
+except ImportError:  # optional; fall back to blocking http.client
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError:  # optional; fall back to stdlib json
+    orjson = None
 
 HOST = "0.0.0.0"
 PORT = int(os.environ.get("PORT", "3000"))
 OPENAI_KEY = os.environ.get("OPENAI_API_KEY")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4")
 API_TIMEOUT = 60  # seconds
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+MAX_BODY = 64 * 1024  # bytes; larger /generate request bodies are rejected
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "32"))  # concurrent requests
+CLIENT_TIMEOUT = 20  # seconds a client socket may stall before its worker is freed
+ZIP_STORE_BELOW = 512  # bytes; smaller text files are stored uncompressed
+B64_CHUNK = 4096  # base64 characters decoded per write; must be a multiple of 4
+B64_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+JSON_CANDIDATE_LIMIT = 16  # balanced spans try_extract_json() will attempt to parse
+OPENAI_HOST = "api.openai.com"
+OPENAI_PATH = "/v1/chat/completions"
+OPENAI_URL = f"https://{OPENAI_HOST}{OPENAI_PATH}"
+
+# Request pieces that never change, built once rather than per request.
+SYSTEM_PROMPT = (
+    "You are a code generation assistant. Output JSON ONLY (no extra commentary) "
+    "with this exact shape:\n"
+    '{"files":[{"path":"relative/path/filename.ext","content":"file contents as a string"}]}\n'
+    "Rules:\n"
+    "- 'content' must be plain text. Escape characters in JSON as needed.\n"
+    "- If a file is binary, include 'encoding':'base64' and put base64 data in 'content'.\n"
+    "- Output ONLY the JSON object."
+)
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+# Keep it permissive for local use; tighten for production.
+CORS_HEADERS = (
+    ("Access-Control-Allow-Origin", "*"),
+    ("Access-Control-Allow-Methods", "GET, POST, OPTIONS"),
+    ("Access-Control-Allow-Headers", "Content-Type"),
+)
+CORS_HEADER_LINES = "".join(f"{k}: {v}\r\n" for k, v in CORS_HEADERS)
+# Characters that could break out of the quoted Content-Disposition filename.
+FILENAME_UNSAFE = str.maketrans({c: "_" for c in '"\r\n\\/\x00'})
+OPENAI_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {OPENAI_KEY}",
+    "User-Agent": "ai-code-generator-single-file/0.1",
+    "Accept-Encoding": "gzip",  # aiohttp decompresses on its own
+}
+
+# Errors meaning a pooled keep-alive connection was already closed by the peer.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    ConnectionResetError,
+    BrokenPipeError,
+    ConnectionAbortedError,
+)
+
+if aiohttp is None:
+    CONNECTION_ERRORS = (OSError, http.client.HTTPException)
+else:
+    CONNECTION_ERRORS = (OSError, http.client.HTTPException, aiohttp.ClientError)
+
+logger = logging.getLogger("aicodegen")
+
+# JSON helpers: _loads accepts str or bytes, _dumps returns UTF-8 bytes.
+if orjson is None:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+else:
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+
+# Shared event loop and aiohttp session, started by start_async_client().
+# Handler threads hand their OpenAI call to this loop, so a single thread
+# multiplexes every in-flight upstream request over pooled connections.
+_loop = None
+_session = None
+
+# Idle keep-alive connections for the blocking fallback. The lock only guards
+# the list; each request owns its connection while it is in flight, so
+# concurrent generations do not queue behind one another.
+_conn_lock = threading.Lock()
+_idle_conns = []
+
+# OpenAI calls currently in flight, keyed by a hash of the request body.
+# Identical concurrent generations wait on the first one's Future.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Worker processes for build_zip(), started by run_server() so that zlib and
+# base64 work stays off the request threads. When it is None (e.g. the module
+# is imported rather than run) archives are built in the calling thread.
+_zip_pool = None
+_zip_pool_lock = threading.Lock()
 
 
 INDEX_HTML = """<!doctype html>
@@ -147,34 +255,325 @@ INDEX_HTML = """<!doctype html>
 </html>
 """
 
+# The page never changes, so encode (and gzip) it once at import time.
+INDEX_BYTES = INDEX_HTML.encode("utf-8")
+INDEX_LEN = str(len(INDEX_BYTES))
+INDEX_GZ = gzip.compress(INDEX_BYTES, compresslevel=9)
+INDEX_GZ_LEN = str(len(INDEX_GZ))
+# Weak, because the plain and gzip bodies share it.
+INDEX_ETAG = 'W/"' + hashlib.sha1(INDEX_BYTES).hexdigest()[:16] + '"'
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Return True if an Accept-Encoding header allows a gzip response.
+
+    An explicit "gzip" entry wins over "*"; either is refused with q=0.
+    """
+    wildcard = None
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            return q > 0
+        if coding == "*":
+            wildcard = q > 0
+    return bool(wildcard)
+
 
 def try_extract_json(text: str):
-    """Try to extract the first JSON object substring from text and parse it."""
+    """Try to extract the first JSON object substring from text and parse it.
+
+    A single forward pass keeps a stack of open braces (ignoring braces
+    inside JSON strings) and records every balanced span, so prose or code
+    fences around the object never end up in a parsed slice. Spans are tried
+    in start order; at most JSON_CANDIDATE_LIMIT of them are parsed.
+    """
     if not text or not isinstance(text, str):
         return None
-    first = text.find("{")
-    last = text.rfind("}")
-    if first == -1 or last == -1 or last < first:
+    stack = []
+    spans = []
+    tried = 0
+
+    def first_valid():
+        nonlocal tried
+        spans.sort()
+        for start, end in spans:
+            if tried >= JSON_CANDIDATE_LIMIT:
+                break
+            tried += 1
+            try:
+                return _loads(text[start:end+1])
+            except Exception:
+                # Balanced but not JSON (e.g. "{name}" in prose).
+                pass
+        spans.clear()
         return None
-    sub = text[first:last+1]
+
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            # Quotes in prose outside any object do not start a string.
+            in_string = bool(stack)
+        elif ch == "{":
+            stack.append(i)
+        elif ch == "}" and stack:
+            spans.append((stack.pop(), i))
+            if not stack:
+                # No earlier brace is still open, so every candidate that
+                # starts before this point is known; try them now.
+                parsed = first_valid()
+                if parsed is not None or tried >= JSON_CANDIDATE_LIMIT:
+                    return parsed
+    # Leftovers are nested inside an unbalanced brace (e.g. truncated output).
+    return first_valid()
+
+
+def write_base64_entry(zf, path: str, content: str):
+    """Decode base64 `content` into a stored ZIP entry.
+
+    Clean input (no whitespace, padded) is decoded B64_CHUNK characters at a
+    time straight into the archive, so the full decoded file is never held
+    in memory. Anything else is decoded in one binascii call, which skips
+    whitespace itself. Raises on invalid data before anything is written.
+    """
+    if not isinstance(content, str) or len(content) % 4 or not B64_RE.fullmatch(content):
+        zf.writestr(path, binascii.a2b_base64(content), compress_type=zipfile.ZIP_STORED)
+        return
+
+    zinfo = zipfile.ZipInfo(path, date_time=time.localtime(time.time())[:6])
+    zinfo.external_attr = 0o600 << 16
+    zinfo.file_size = len(content) // 4 * 3 - (len(content) - len(content.rstrip("=")))
+    with zf.open(zinfo, "w") as dest:
+        for i in range(0, len(content), B64_CHUNK):
+            dest.write(binascii.a2b_base64(content[i:i + B64_CHUNK]))
+
+
+def build_zip(files: list) -> bytes:
+    """Build the ZIP archive for the model's file list and return its bytes.
+
+    Module-level so it can run in the _zip_pool worker processes.
+    """
+    zip_buffer = io.BytesIO()
+    # Deflate at level 1: much cheaper than the default level 6 for a few
+    # percent in size. Tiny files and base64 payloads (usually already
+    # compressed binaries) are stored as-is.
+    with zipfile.ZipFile(zip_buffer, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for f in files:
+            path = f.get("path")
+            content = f.get("content")
+            encoding = f.get("encoding")
+            if not path or content is None:
+                continue
+            if encoding == "base64":
+                try:
+                    write_base64_entry(zf, path, content)
+                except Exception:
+                    # Skip bad entry
+                    continue
+            else:
+                # Write text (ensure it's str)
+                if not isinstance(content, str):
+                    content = str(content)
+                # isascii() is a flag check; ASCII source skips the UTF-8 codec.
+                data = content.encode("ascii") if content.isascii() else content.encode("utf-8")
+                if len(data) < ZIP_STORE_BELOW:
+                    zf.writestr(path, data, compress_type=zipfile.ZIP_STORED)
+                else:
+                    zf.writestr(path, data)
+    return zip_buffer.getvalue()
+
+
+def new_zip_pool():
+    """Create the build_zip() worker pool."""
+    # "spawn" keeps workers from inheriting the parent's threads and locks.
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count() or 2, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def replace_zip_pool(broken):
+    """Swap out a pool left unusable by a dead worker (once per breakage)."""
+    global _zip_pool
+    with _zip_pool_lock:
+        if _zip_pool is broken:
+            _zip_pool = new_zip_pool()
+    broken.shutdown(wait=False)
+
+
+def start_logging():
+    """Send log records through a queue to a background stderr writer.
+
+    Request threads only enqueue records, so a slow or blocked stderr never
+    stalls them.
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    listener.start()
+    return listener
+
+
+def start_async_client():
+    """Start the background event loop and shared aiohttp session (if available)."""
+    global _loop, _session
+    if aiohttp is None or _loop is not None:
+        return
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def make_session():
+        connector = aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+        return aiohttp.ClientSession(connector=connector)
+
+    _session = asyncio.run_coroutine_threadsafe(make_session(), loop).result()
+    _loop = loop
+
+
+def stop_async_client():
+    """Close the shared aiohttp session and stop the event loop."""
+    global _loop, _session
+    if _loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(_session.close(), _loop).result(timeout=5)
+    _loop.call_soon_threadsafe(_loop.stop)
+    _loop = _session = None
+
+
+async def call_openai(body: bytes, headers: dict):
+    """POST a chat completion request on the shared session."""
+    timeout = aiohttp.ClientTimeout(total=API_TIMEOUT)
+    async with _session.post(OPENAI_URL, data=body, headers=headers, timeout=timeout) as resp:
+        return resp.status, await resp.read()
+
+
+def request_openai(body: bytes):
+    """Send a chat completion request and return (status, response bytes).
+
+    Uses the async client when it is running, otherwise a pooled keep-alive
+    HTTPS connection so back-to-back requests skip the TLS handshake.
+    """
+    if _loop is not None:
+        return asyncio.run_coroutine_threadsafe(call_openai(body, OPENAI_HEADERS), _loop).result()
+
+    with _conn_lock:
+        conn = _idle_conns.pop() if _idle_conns else None
+    reused = conn is not None
+    while True:
+        if conn is None:
+            conn = http.client.HTTPSConnection(OPENAI_HOST, timeout=API_TIMEOUT)
+        resp = None
+        try:
+            conn.request("POST", OPENAI_PATH, body=body, headers=OPENAI_HEADERS)
+            resp = conn.getresponse()
+            data = resp.read()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused or resp is not None:
+                raise
+            # The server dropped an idle connection before answering; retry
+            # once on a fresh one. Timeouts are never retried, since the
+            # request may already be generating upstream.
+            conn, reused = None, False
+            continue
+        except BaseException:
+            conn.close()
+            raise
+        break
+
+    if resp.will_close:
+        conn.close()
+    else:
+        with _conn_lock:
+            _idle_conns.append(conn)
+    if resp.getheader("Content-Encoding") == "gzip":
+        data = gzip.decompress(data)
+    return resp.status, data
+
+
+def request_openai_shared(body: bytes):
+    """Like request_openai(), but identical concurrent requests share one call."""
+    key = hashlib.blake2b(body, digest_size=16).digest()
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = _inflight[key] = Future()
+    if not owner:
+        return fut.result()
+
     try:
-        return json.loads(sub)
-    except Exception:
-        return None
+        result = request_openai(body)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    else:
+        fut.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+class ThreadedHTTPServer(HTTPServer):
+    """HTTPServer that handles each connection on a fixed-size thread pool.
+
+    Unlike ThreadingMixIn this never spawns more than MAX_WORKERS threads;
+    extra connections wait in the pool's queue instead.
+    """
 
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS):
+        super().__init__(server_address, handler_class)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http")
 
-class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
-    daemon_threads = True
+    def process_request(self, request, client_address):
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False)
 
 
 class Handler(BaseHTTPRequestHandler):
     server_version = "AICodeGen/0.1"
+    # With a fixed worker pool, idle or slow clients must not hold a worker
+    # forever; stalled reads/writes raise and the connection is dropped.
+    timeout = CLIENT_TIMEOUT
+
+    def log_message(self, format, *args):
+        # Route access/error lines through the queued logger instead of stderr.
+        logger.info("%s - %s", self.address_string(), format % args)
 
     def _set_cors_headers(self):
-        # Keep it permissive for local use; tighten for production.
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        for keyword, value in CORS_HEADERS:
+            self.send_header(keyword, value)
 
     def do_OPTIONS(self):
         self.send_response(HTTPStatus.NO_CONTENT)
@@ -185,10 +584,28 @@ class Handler(BaseHTTPRequestHandler):
         if self.path not in ("/", "/index.html"):
             self.send_error(HTTPStatus.NOT_FOUND, "Not found")
             return
-        content = INDEX_HTML.encode("utf-8")
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            if "*" in tags or INDEX_ETAG in tags or INDEX_ETAG[2:] in tags:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", INDEX_ETAG)
+                self.send_header("Cache-Control", "max-age=60")
+                self.send_header("Vary", "Accept-Encoding")
+                self.end_headers()
+                return
+        if accepts_gzip(self.headers.get("Accept-Encoding", "")):
+            content, length = INDEX_GZ, INDEX_GZ_LEN
+        else:
+            content, length = INDEX_BYTES, INDEX_LEN
         self.send_response(HTTPStatus.OK)
         self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Content-Length", length)
+        if content is INDEX_GZ:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("ETag", INDEX_ETAG)
+        self.send_header("Cache-Control", "max-age=60")
+        self.send_header("Vary", "Accept-Encoding")
         self._set_cors_headers()
         self.end_headers()
         self.wfile.write(content)
@@ -204,14 +621,23 @@ class Handler(BaseHTTPRequestHandler):
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.end_headers()
             body = {"error": "Server missing OPENAI_API_KEY environment variable"}
-            self.wfile.write(json.dumps(body).encode("utf-8"))
+            self.wfile.write(_dumps(body))
             return
 
         # Read request body
-        length = int(self.headers.get("Content-Length", "0"))
+        try:
+            length = int(self.headers.get("Content-Length") or "0")
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+            return
+        if length > MAX_BODY:
+            self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Payload too large")
+            return
         raw = self.rfile.read(length) if length else b"{}"
         try:
-            payload = json.loads(raw.decode("utf-8"))
+            payload = _loads(raw)
         except Exception:
             payload = {}
         prompt = payload.get("prompt", "")
@@ -219,15 +645,6 @@ class Handler(BaseHTTPRequestHandler):
         project_name = payload.get("projectName", "project")
 
         # Build prompts
-        system_prompt = (
-            "You are a code generation assistant. Output JSON ONLY (no extra commentary) "
-            "with this exact shape:\n"
-            '{"files":[{"path":"relative/path/filename.ext","content":"file contents as a string"}]}\n'
-            "Rules:\n"
-            "- 'content' must be plain text. Escape characters in JSON as needed.\n"
-            "- If a file is binary, include 'encoding':'base64' and put base64 data in 'content'.\n"
-            "- Output ONLY the JSON object."
-        )
         user_message = (
             f"Project name: {project_name}\n"
             f"Language/stack: {language}\n"
@@ -238,76 +655,72 @@ class Handler(BaseHTTPRequestHandler):
         # Prepare OpenAI API request
         openai_payload = {
             "model": OPENAI_MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ],
+            "messages": (SYSTEM_MESSAGE, {"role": "user", "content": user_message}),
             "temperature": 0.2,
             "max_tokens": 2000,
         }
-        req = urllib_request.Request(
-            "https://api.openai.com/v1/chat/completions",
-            data=json.dumps(openai_payload).encode("utf-8"),
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_KEY}",
-                "User-Agent": "ai-code-generator-single-file/0.1",
-            },
-            method="POST",
-        )
-
         try:
-            with urllib_request.urlopen(req, timeout=API_TIMEOUT) as resp:
-                result_text = resp.read().decode("utf-8")
-                try:
-                    result_json = json.loads(result_text)
-                except Exception:
-                    result_json = None
-        except HTTPError as e:
-            err_body = e.read().decode("utf-8", errors="ignore")
-            print("OpenAI HTTPError:", e.code, err_body)
+            status, result_bytes = request_openai_shared(_dumps(openai_payload))
+        except CONNECTION_ERRORS as e:
+            logger.warning("OpenAI connection error: %s", e)
             self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
             self._set_cors_headers()
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.end_headers()
-            self.wfile.write(json.dumps({"error": "OpenAI API HTTP error", "details": err_body}).encode("utf-8"))
+            self.wfile.write(_dumps({"error": "OpenAI API connection error", "details": str(e)}))
             return
-        except URLError as e:
-            print("OpenAI URLError:", e)
+        except Exception as e:
+            logger.warning("OpenAI request failed: %s", e)
             self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
             self._set_cors_headers()
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.end_headers()
-            self.wfile.write(json.dumps({"error": "OpenAI API connection error", "details": str(e)}).encode("utf-8"))
+            self.wfile.write(_dumps({"error": "OpenAI API request failed", "details": str(e)}))
             return
-        except Exception as e:
-            print("OpenAI request failed:", e)
+
+        if status >= 400:
+            err_body = result_bytes.decode("utf-8", errors="ignore")
+            logger.warning("OpenAI HTTPError %s: %s", status, err_body)
             self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
             self._set_cors_headers()
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.end_headers()
-            self.wfile.write(json.dumps({"error": "OpenAI API request failed", "details": str(e)}).encode("utf-8"))
+            self.wfile.write(_dumps({"error": "OpenAI API HTTP error", "details": err_body}))
             return
 
+        try:
+            result_json = _loads(result_bytes)
+        except Exception:
+            result_json = None
+
         # Extract assistant message content
         assistant_text = None
         if result_json and "choices" in result_json and len(result_json["choices"]) > 0:
             # Chat completion schema: choices[0].message.content
             assistant_text = result_json["choices"][0].get("message", {}).get("content")
         if not assistant_text:
-            # Fallback: try to parse raw response text for content field
-            assistant_text = result_text
+            # Fallback: try to parse raw response text for content field.
+            # Only decoded here, so the common path never copies the envelope.
+            assistant_text = result_bytes.decode("utf-8", errors="replace")
 
         # Try to parse JSON from assistant_text
         parsed = None
         try:
-            parsed = json.loads(assistant_text)
+            parsed = _loads(assistant_text)
         except Exception:
             parsed = try_extract_json(assistant_text)
 
-        if not parsed or not isinstance(parsed.get("files"), list):
+        files = None
+        if isinstance(parsed, dict) and isinstance(parsed.get("files"), list):
+            # Drop unusable entries now so an empty list never reaches build_zip().
+            files = [
+                f for f in parsed["files"]
+                if isinstance(f, dict) and isinstance(f.get("path"), str) and f["path"]
+                and f.get("content") is not None
+            ]
+        if not files:
             # Return error JSON for debugging
-            print("Failed to parse JSON from model. Raw output:\n", assistant_text)
+            logger.warning("Failed to parse JSON from model. Raw output:\n%s", assistant_text)
             self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
             self._set_cors_headers()
             self.send_header("Content-Type", "application/json; charset=utf-8")
@@ -316,51 +729,74 @@ class Handler(BaseHTTPRequestHandler):
                 "error": "Failed to parse files JSON from model response",
                 "model_output": assistant_text
             }
-            self.wfile.write(json.dumps(body).encode("utf-8"))
+            self.wfile.write(_dumps(body))
             return
 
-        # Build ZIP in-memory
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for f in parsed["files"]:
-                path = f.get("path")
-                content = f.get("content")
-                encoding = f.get("encoding")
-                if not path or content is None:
-                    continue
-                if encoding == "base64":
+        # Sorted by path so the same files always give the same entry order.
+        files.sort(key=operator.itemgetter("path"))
+        try:
+            pool = _zip_pool
+            if pool is None:
+                zip_bytes = build_zip(files)
+            else:
+                try:
+                    zip_bytes = pool.submit(build_zip, files).result()
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM) and the pool stays broken
+                    # forever. Replace it and retry once there; never build
+                    # inline, where the same input could take down the server.
+                    logger.warning("ZIP worker pool broke; restarting it")
+                    replace_zip_pool(pool)
+                    pool = _zip_pool
                     try:
-                        data = base64.b64decode(content)
-                    except Exception:
-                        # Skip bad entry
-                        continue
-                    zf.writestr(path, data)
-                else:
-                    # Write text (ensure it's str)
-                    if not isinstance(content, str):
-                        content = str(content)
-                    zf.writestr(path, content.encode("utf-8"))
-
-        zip_bytes = zip_buffer.getvalue()
+                        zip_bytes = pool.submit(build_zip, files).result()
+                    except BrokenProcessPool:
+                        replace_zip_pool(pool)
+                        raise
+        except Exception as e:
+            logger.error("Failed to build ZIP: %s", e)
+            self.send_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+            self._set_cors_headers()
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.end_headers()
+            self.wfile.write(_dumps({"error": "Failed to build ZIP", "details": str(e)}))
+            return
 
-        # Send ZIP response
-        self.send_response(HTTPStatus.OK)
-        self._set_cors_headers()
-        self.send_header("Content-Type", "application/zip")
-        self.send_header("Content-Disposition", f'attachment; filename="{project_name}.zip"')
-        self.send_header("Content-Length", str(len(zip_bytes)))
-        self.end_headers()
-        self.wfile.write(zip_bytes)
+        # Send ZIP response. The head is built by hand so status line,
+        # headers and body leave in a single write instead of several.
+        filename = str(project_name).translate(FILENAME_UNSAFE)[:64] or "project"
+        head = (
+            f"{self.protocol_version} 200 OK\r\n"
+            f"Server: {self.version_string()}\r\n"
+            f"Date: {self.date_time_string()}\r\n"
+            f"{CORS_HEADER_LINES}"
+            "Content-Type: application/zip\r\n"
+            f'Content-Disposition: attachment; filename="{filename}.zip"\r\n'
+            f"Content-Length: {len(zip_bytes)}\r\n"
+            "\r\n"
+        )
+        self.log_request(HTTPStatus.OK, len(zip_bytes))
+        # Header values go out as latin-1; replace anything it cannot encode.
+        self.wfile.write(head.encode("latin-1", "replace") + zip_bytes)
 
 
 def run_server():
+    global _zip_pool
+    listener = start_logging()
     server = ThreadedHTTPServer((HOST, PORT), Handler)
+    _zip_pool = new_zip_pool()
+    start_async_client()
     print(f"Serving on http://{HOST}:{PORT}  (OpenAI model={OPENAI_MODEL})")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("Shutting down...")
         server.shutdown()
+    finally:
+        server.server_close()
+        stop_async_client()
+        _zip_pool.shutdown()
+        listener.stop()
 
 
 if __name__ == "__main__":